@@ -1,14 +1,33 @@
 """This module implements a local json-file-based representation of a relational db
 
-FIXME: Saving and/or loading get quite slow when the number of rows in a table (usually
-  data_series) grows to hundreds. How to figure out why that happens?
+Saving and loading used to get quite slow when the number of rows in a table (usually
+data_series) grew to hundreds, because every row lookup and every new id listed the
+table's folder. DirBackend therefore keeps an index of each table's rows and its next
+available id in memory, checking the modification time of a table's folder to notice
+rows added by other processes.
   # see https://github.com/ixdat/ixdat/pull/11#discussion_r663468719
 """
 
 
 import json
+import math
+import os
+import re
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+
+try:
+    import orjson  # optional. Much faster than json, and serializes numpy types.
+except ImportError:
+    orjson = None
+try:
+    import ijson  # optional. For reading only some items of large rows.
+except ImportError:
+    ijson = None
+
 from .backend_base import BackendBase
+from ..exceptions import DataBaseError
 from ..config import config, prompt_for_permission
 
 
@@ -31,13 +50,112 @@ def fix_name_for_saving(name):
     return name
 
 
+ID_PATTERN = re.compile(r"^(\d+)_")  # row files are named "<id>_<name><suffix>"
+
+
+def id_from_name(file_name):
+    """Return the id (int) of the row represented by an ixdat file name, or None"""
+    match = ID_PATTERN.match(file_name)
+    return int(match.group(1)) if match else None
+
+
 def id_from_path(path):
     """Return the id (int) of the row represented by given path to an ixdat file"""
+    return id_from_name(path.name)
+
+
+def has_non_finite_floats(thing):
+    """Return whether thing is, or contains, a NaN or infinite float"""
+    if isinstance(thing, float):  # including np.float64
+        return not math.isfinite(thing)
+    if isinstance(thing, dict):
+        return any(has_non_finite_floats(value) for value in thing.values())
+    if isinstance(thing, (list, tuple)):
+        return any(has_non_finite_floats(item) for item in thing)
+    if isinstance(thing, (np.ndarray, np.floating)) and thing.dtype.kind in "fc":
+        return not np.all(np.isfinite(thing))
+    return False
+
+
+def numpy_to_builtin(thing):
+    """Return numpy arrays and scalars as lists and numbers, for json to serialize"""
+    if isinstance(thing, (np.ndarray, np.generic)):
+        return thing.tolist()
+    raise TypeError(f"Object of type {type(thing).__name__} is not JSON serializable")
+
+
+def write_json_file(path, obj_as_dict):
+    """Write obj_as_dict to a JSON file at path, using orjson if it is installed
+
+    json is used instead for what orjson can't write, or would write differently:
+    NaN and infinity (which orjson writes as null), integers of more than 64 bits,
+    and some numpy arrays. So whether a row can be saved doesn't depend on orjson.
+    """
+    if orjson is not None and not has_non_finite_floats(obj_as_dict):
+        try:
+            payload = orjson.dumps(
+                obj_as_dict,
+                default=numpy_to_builtin,
+                option=orjson.OPT_INDENT_2
+                | orjson.OPT_SERIALIZE_NUMPY
+                | orjson.OPT_NON_STR_KEYS,
+            )
+        except TypeError:  # including orjson.JSONEncodeError
+            pass
+        else:
+            with open(path, "wb") as f:
+                f.write(payload)
+            return
+    with open(path, "w") as f:
+        json.dump(obj_as_dict, f, indent=4, default=numpy_to_builtin)
+
+
+def read_json_file(path):
+    """Return the dictionary in the JSON file at path, using orjson if it is installed
+
+    orjson can't read the NaN and Infinity written by json, so json reads those files.
+    The file is read as bytes, which json decodes as UTF-8, as written by orjson.
+    """
+    with open(path, "rb") as f:
+        payload = f.read()
+    if orjson is None:
+        return json.loads(payload)
     try:
-        return int(path.stem.split("_")[0])
-    except ValueError:
-        print(f"couldn't find id in {path}")  # debugging
-        return None
+        return orjson.loads(payload)
+    except orjson.JSONDecodeError:
+        return json.loads(payload)
+
+
+def read_json_file_items(path, keys):
+    """Return a dictionary with only the given top-level items of the JSON file at path
+
+    With ijson installed, the file is parsed only until all of the items are found.
+    ijson can't read the NaN and Infinity written by json, so those files are read
+    in full.
+    """
+    keys = set(keys)
+    if ijson is not None:
+        items = {}
+        try:
+            with open(path, "rb") as f:
+                for key, value in ijson.kvitems(f, "", use_float=True):
+                    if key in keys:
+                        items[key] = value
+                        if len(items) == len(keys):
+                            break
+            return items
+        except ijson.JSONError:
+            pass
+    obj_as_dict = read_json_file(path)
+    return {key: value for key, value in obj_as_dict.items() if key in keys}
+
+
+def remove_if_exists(path):
+    """Remove the file at path, e.g. a temporary file left by a failed save, if any"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
 
 def name_from_path(path):
@@ -71,9 +189,19 @@ class DirBackend(BackendBase):
         """
         self.project_directory = directory / project_name
         self.project_directory.mkdir(parents=True, exist_ok=True)
+        # This identifies the directory (following links) for comparing backends:
+        stat_result = self.project_directory.stat()
+        self._directory_key = (stat_result.st_dev, stat_result.st_ino)
 
         self.metadata_suffix = metadata_suffix
         self.data_suffix = data_suffix
+        # {table_name (str): {id (int): path to row (Path)}}, filled in lazily so that
+        # looking up rows doesn't require listing the table's folder every time:
+        self._id_index = {}
+        # {table_name (str): st_mtime_ns of the folder (int) when last indexed by us}.
+        # Another process (or backend) adding rows changes it, showing that the index
+        # and the next available id of that table are stale:
+        self._folder_mtimes = {}
         super().__init__()
 
     @property
@@ -96,11 +224,19 @@ class DirBackend(BackendBase):
         # first, so that they get their id's in this backend for the main object to
         # correctly reference. This is done recursively.
         if obj.child_attrs:
-            for child_list_name in obj.child_attrs:
-                # save any data objects first as this may change the references
-                child_list = getattr(obj, child_list_name) or []
-                for child_obj in child_list:
+            child_objs = [
+                child_obj
+                for child_list_name in obj.child_attrs
+                for child_obj in getattr(obj, child_list_name) or []
+            ]
+            if force:
+                # save_many() doesn't update saved objects, so do them one by one:
+                for child_obj in child_objs:
                     self.save(child_obj, force=force, no_updates=True)
+            else:
+                # Saving them together allocates the ids of each table's new rows at
+                # once, and writes those rows as a batch
+                self.save_many(child_objs)
         # Now we're ready to save the main object.
         # The table_name is the table, the as_dict is the info for the row in the table.
         table_name = obj.table_name
@@ -127,6 +263,44 @@ class DirBackend(BackendBase):
             obj.set_backend(self)
             return i
 
+    def save_many(self, objs):
+        """Save several Savable objects, writing the new rows of each table as a batch
+
+        As in save(), the objects' children are saved first. Objects that are already
+        saved in this backend are left as they are, as with save(no_updates=True).
+
+        Args:
+            objs (list of Savable): The objects to save
+
+        Returns:
+            list of int: The ids of the objects in this backend
+        """
+        objs = list(objs)
+        children = [
+            child_obj
+            for obj in objs
+            for child_list_name in obj.child_attrs or []
+            for child_obj in getattr(obj, child_list_name) or []
+        ]
+        if children:
+            self.save_many(children)
+        # Group the unsaved objects by table, leaving out any duplicates:
+        objs_by_table = {}
+        seen = set()
+        for obj in objs:
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            if obj.backend is self and self.contains(obj.table_name, obj.id):
+                continue
+            objs_by_table.setdefault(obj.table_name, []).append(obj)
+        for table_name, table_objs in objs_by_table.items():
+            ids = self.add_rows(table_name, [obj.as_dict() for obj in table_objs])
+            for obj, i in zip(table_objs, ids):
+                obj.set_id(i)
+                obj.set_backend(self)
+        return [obj.id for obj in objs]
+
     def save_data(self, data, table_name, i, fixed_name=None):
         """Save the data item of a given row, by default as .ix.npy
 
@@ -137,13 +311,53 @@ class DirBackend(BackendBase):
             fixed_name (the name of the data, just used for the file name
         """
         folder = self.project_directory / table_name
-        data_file_name = f"{i}_{fixed_name}{self.data_suffix}"
-        np.save(folder / data_file_name, data)
+        path_to_data = folder / f"{i}_{fixed_name}{self.data_suffix}"
+        tmp_path = path_to_data.with_name(path_to_data.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                # C-contiguous data on disk can be memory-mapped and sliced without
+                # copying. Object data is pickled, and can't be memory-mapped.
+                np.save(f, np.ascontiguousarray(data))
+        except BaseException:
+            remove_if_exists(tmp_path)
+            raise
+        # Replacing, rather than overwriting, the file gives it a new inode. This keeps
+        # valid any memory map of the old file, which may be the very data being saved.
+        os.replace(tmp_path, path_to_data)
 
     def get(self, cls, i):
         """Open a Saveable object represented as row i of table cls.table_name"""
+        obj_as_dict = self.get_row_as_dict(cls.table_name, i)
+        return self._object_from_row(cls, i, obj_as_dict)
+
+    def get_many(self, cls, ids, max_workers=8):
+        """Open the Saveable objects represented as rows `ids` of table cls.table_name
+
+        The rows are read in a pool of threads, so that the waits for the file system
+        overlap. This helps most when the files are not already cached by the OS.
+
+        Args:
+            cls (Saveable class): The class of the objects, specifying the table
+            ids (list of int): The ids of the rows representing the objects
+            max_workers (int): The maximum number of rows to read at a time
+
+        Returns:
+            list of Saveable: The objects, in the order of ids
+        """
+        ids = list(ids)  # as they are used twice
         table_name = cls.table_name
-        obj_as_dict = self.get_row_as_dict(table_name, i)
+        self._ensure_index(table_name)  # so that the threads don't each list the table
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            obj_as_dicts = list(
+                executor.map(lambda i: self.get_row_as_dict(table_name, i), ids)
+            )
+        return [
+            self._object_from_row(cls, i, obj_as_dict)
+            for i, obj_as_dict in zip(ids, obj_as_dicts)
+        ]
+
+    def _object_from_row(self, cls, i, obj_as_dict):
+        """Return an object of class cls from the serialization in its row i"""
         i = obj_as_dict.pop("id", i)
         obj = cls.from_dict(obj_as_dict)
         obj.set_backend(self)
@@ -155,10 +369,25 @@ class DirBackend(BackendBase):
         return i in self.get_id_list(table_name)
 
     def load_obj_data(self, obj):
-        """Return the data for an object loaded from its .ixdata file"""
+        """Return the data for an object loaded from its .ixdata file
+
+        The data is memory-mapped, so that it is only read from disk as it is used.
+        This means that the returned array is read-only. Use its copy() to modify it.
+        On Windows, a file can't be replaced while it is mapped, which would prevent
+        re-saving the data, so there it is read in full (but still read-only).
+        """
         path_to_row = self.get_path_to_row(obj.table_name, obj.id)
         try:
-            return np.load(path_to_row.with_suffix(self.data_suffix))
+            data = np.load(
+                path_to_row.with_suffix(self.data_suffix),
+                mmap_mode=None if os.name == "nt" else "r",
+                allow_pickle=False,
+            )
+            # A plain ndarray view (still backed by any memory map) behaves like any
+            # other loaded data, e.g. when comparing with thing_is_close.
+            data = data.view(np.ndarray)
+            data.flags.writeable = False
+            return data
         except FileNotFoundError:
             # there's no data to be got.
             print(f"could not find file {path_to_row}")
@@ -166,80 +395,239 @@ class DirBackend(BackendBase):
 
     def add_row(self, table_name, obj_as_dict):
         """Save object's serialization to the folder table_name (like adding a row)"""
+        (i,) = self.add_rows(table_name, [obj_as_dict])
+        return i
+
+    def add_rows(self, table_name, obj_as_dicts):
+        """Save several objects' serializations to the folder table_name at once
+
+        The ids of all the rows are allocated at once, and all the rows are written to
+        temporary files before any of them are moved into place. If writing any of them
+        fails, the files already written for the batch are removed.
+
+        Args:
+            table_name (str): The name of the table to save in
+            obj_as_dicts (list of dict): The serializations of the objects to save
+
+        Returns:
+            list of int: The ids of the new rows, in the order of obj_as_dicts
+
+        Raises:
+            DataBaseError: If, despite the index, there already is a row with one of
+                the new ids, e.g. saved by another process at the same time.
+        """
         folder = self.project_directory / table_name
         if not folder.exists():
             folder.mkdir(parents=True)
-        i = self.get_next_available_id(table_name)
-        obj_as_dict.update({"id": i})
-        fixed_name = fix_name_for_saving(obj_as_dict["name"])
-        if "data" in obj_as_dict:
-            self.save_data(obj_as_dict["data"], table_name, i, fixed_name)
-            obj_as_dict["data"] = None  # FIXME this could instead point to the data.
-        file_name = f"{i}_{fixed_name}{self.metadata_suffix}"
-        with open(folder / file_name, "w") as f:
-            json.dump(obj_as_dict, f, indent=4)
-        return i
+        first_id = self.get_next_available_id(table_name)
+        ids = list(range(first_id, first_id + len(obj_as_dicts)))
+        taken_ids = self._find_row_ids(table_name, ids)
+        if taken_ids:
+            self._folder_mtimes.pop(table_name, None)  # to rebuild the index next time
+            raise DataBaseError(
+                f"Can't add rows with ids={sorted(taken_ids)} to table '{table_name}' "
+                "since they already exist. Were they saved by another process?"
+            )
+        tmp_rows = []
+        try:
+            for i, obj_as_dict in zip(ids, obj_as_dicts):
+                tmp_rows.append(
+                    self._write_tmp_row(table_name, i, obj_as_dict, overwrite=False)
+                )
+        except BaseException:
+            for tmp_path, path_to_row in tmp_rows:
+                remove_if_exists(tmp_path)
+                remove_if_exists(path_to_row.with_suffix(self.data_suffix))
+            raise
+        for i, (tmp_path, path_to_row) in zip(ids, tmp_rows):
+            self._replace_row(table_name, i, tmp_path, path_to_row)
+        return ids
 
     def update_row(self, table_name, i, obj_as_dict):
         """Update a file specified by `i` in the folder specified by `table_name`"""
         folder = self.project_directory / table_name
         if not folder.exists():
             folder.mkdir()
-        obj_as_dict.update({"id": i})
+        self._refresh_index(table_name)  # so as not to miss rows added by others
+        tmp_path, path_to_row = self._write_tmp_row(table_name, i, obj_as_dict)
+        self._replace_row(table_name, i, tmp_path, path_to_row)
+
+    def _write_tmp_row(self, table_name, i, obj_as_dict, overwrite=True):
+        """Save the data of row i and write its serialization to a temporary file
+
+        Args:
+            overwrite (bool): Whether the row may already have files. If not (as is
+                checked by add_rows), its data file is removed again if writing the
+                row fails.
+
+        Returns:
+            (Path, Path): The temporary file and the file that should represent the row
+        """
+        folder = self.project_directory / table_name
         fixed_name = fix_name_for_saving(obj_as_dict["name"])
+        path_to_row = folder / f"{i}_{fixed_name}{self.metadata_suffix}"
+        obj_as_dict.update({"id": i})
         if "data" in obj_as_dict:
-            self.save_data(obj_as_dict["data"], table_name, i, fixed_name)
+            with self._writing_in(table_name):
+                self.save_data(obj_as_dict["data"], table_name, i, fixed_name)
             obj_as_dict["data"] = None  # FIXME this could instead point to the data.
-        file_name = f"{i}_{fixed_name}{self.metadata_suffix}"
-        with open(folder / file_name, "w") as f:
-            json.dump(obj_as_dict, f, indent=4)
+        tmp_path = path_to_row.with_name(path_to_row.name + ".tmp")
+        try:
+            with self._writing_in(table_name):
+                write_json_file(tmp_path, obj_as_dict)
+        except BaseException:
+            remove_if_exists(tmp_path)
+            if not overwrite:  # then the data file is new and belongs to no row
+                remove_if_exists(path_to_row.with_suffix(self.data_suffix))
+            raise
+        return tmp_path, path_to_row
+
+    def _replace_row(self, table_name, i, tmp_path, path_to_row):
+        """Move a row's temporary file into place, so a row is never half-written"""
+        with self._writing_in(table_name):
+            os.replace(tmp_path, path_to_row)
+        self._ensure_index(table_name)[i] = path_to_row
+        next_id = self.next_available_ids.get(table_name)
+        if next_id is not None and i >= next_id:  # else it's found from the index
+            self.next_available_ids[table_name] = i + 1
+
+    @contextmanager
+    def _writing_in(self, table_name):
+        """Context for changing the table's folder without making its index stale
+
+        Unless the folder had already been changed by others when the context is
+        entered, its new modification time is recorded as up to date on exit. If it
+        had (or the change fails), the index will be rebuilt when next refreshed.
+        """
+        up_to_date = self._get_folder_mtime(table_name) == self._folder_mtimes.get(
+            table_name
+        )
+        try:
+            yield
+        except BaseException:
+            up_to_date = False
+            raise
+        finally:
+            if up_to_date:
+                self._folder_mtimes[table_name] = self._get_folder_mtime(table_name)
+            else:
+                self._folder_mtimes.pop(table_name, None)
 
-    def get_row_as_dict(self, table_name, i):
-        """Return the serialization of the object represented in row i of table_name"""
+    def _find_row_ids(self, table_name, ids):
+        """Return which of the ids have a row file in the table's folder, whatever name
+
+        Unlike the index, this is sure to be up to date, but it lists the folder.
+        """
+        ids = set(ids)
+        found_ids = set()
+        with os.scandir(self.project_directory / table_name) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.metadata_suffix):
+                    i = id_from_name(entry.name)
+                    if i in ids:
+                        found_ids.add(i)
+        return found_ids
+
+    def get_row_as_dict(self, table_name, i, keys=None):
+        """Return the serialization of the object represented in row i of table_name
+
+        Args:
+            table_name (str): The name of the table
+            i (int): The id of the row
+            keys (list of str): Optional. If given, only these items of the row are
+                read and returned, which is quicker for large rows.
+        """
         path_to_row = self.get_path_to_row(table_name, i)
-        with open(path_to_row, "r") as file:
-            obj_as_dict = json.load(file)
-        return obj_as_dict
+        if keys is not None:
+            return read_json_file_items(path_to_row, keys)
+        return read_json_file(path_to_row)
 
     def get_path_to_row(self, table_name, i):
         """Return the Path to the file representing row i of the table `table_name`"""
-        folder = self.project_directory / table_name
-        for p in folder.iterdir():
-            if id_from_path(p) == i and p.suffix == self.metadata_suffix:
-                return p
-        print(f"could not find row with id={i} in table '{table_name}'")
-        print(f"looking in folder: {folder}")  # debugging
-        return None  # if that row is not in the table.
+        path_to_row = self._ensure_index(table_name).get(i)
+        if path_to_row is None and self._refresh_index(table_name):
+            path_to_row = self._ensure_index(table_name).get(i)
+        if path_to_row is None:
+            print(f"could not find row with id={i} in table '{table_name}'")
+            print(f"looking in folder: {self.project_directory / table_name}")
+        return path_to_row  # None if that row is not in the table.
 
     def get_id_list(self, table_name):
-        """List the principle keys of the existing rows of a given table"""
-        folder = self.project_directory / table_name
-        id_list = []
-        for file in folder.iterdir():
-            if not file.is_dir():
-                try:
-                    i = int(file.name.split("_")[0])
-                    id_list.append(i)
-                except TypeError:
-                    pass
-        return id_list
+        """Return the principle keys of the existing rows of a given table
+
+        This is a view of the current index of the table, for fast `in` checks. Treat
+        it as a snapshot: it is left behind when the index is rebuilt (e.g. after
+        another process adds rows), and iterating over it while saving raises a
+        RuntimeError. Use list() on it to get a list of the present ids, e.g. to
+        save while iterating over them.
+        """
+        return self._ensure_index(table_name).keys()
 
     def get_next_available_id(self, table_name, obj=None):
-        """Return the next available id for a given table"""
-        id_list = self.get_id_list(table_name)
-        if not id_list:
-            return 1
-        return max(self.get_id_list(table_name)) + 1
+        """Return the next available id for a given table
+
+        The table's largest id is only looked for when the table's folder has changed
+        since it was last indexed, e.g. by another process adding rows. Otherwise, the
+        next available id is kept up to date as rows are written (see _replace_row).
+        """
+        self._refresh_index(table_name)
+        if table_name not in self.next_available_ids:
+            self.next_available_ids[table_name] = (
+                max(self._ensure_index(table_name), default=0) + 1
+            )
+        return self.next_available_ids[table_name]
+
+    def _ensure_index(self, table_name):
+        """Return the {id: path} index of the table, listing its folder only once"""
+        if table_name not in self._id_index:
+            index = {}
+            folder = self.project_directory / table_name
+            # Before scanning, so that rows added during the scan make it stale:
+            self._folder_mtimes[table_name] = self._get_folder_mtime(table_name)
+            if folder.exists():
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        # DirEntry caches the file type, so this costs no extra stat()
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        name = entry.name
+                        if not name.endswith(self.metadata_suffix):
+                            continue
+                        i = id_from_name(name)
+                        if i is not None:
+                            index[i] = folder / name
+            self._id_index[table_name] = index
+        return self._id_index[table_name]
+
+    def _refresh_index(self, table_name):
+        """Forget the index and next id of table_name if its folder has changed
+
+        Returns:
+            bool: Whether the index was stale and has been forgotten
+        """
+        if table_name not in self._id_index:
+            return False
+        if self._get_folder_mtime(table_name) == self._folder_mtimes.get(table_name):
+            return False
+        self._id_index.pop(table_name, None)  # get_many may call this in threads
+        self.next_available_ids.pop(table_name, None)
+        return True
+
+    def _get_folder_mtime(self, table_name):
+        """Return the modification time of the table's folder in ns, None if missing"""
+        try:
+            return os.stat(self.project_directory / table_name).st_mtime_ns
+        except FileNotFoundError:
+            return None
 
     def __eq__(self, other):
         """Two DirBackends are equivalent if they refer to the same directory"""
         if other is self:
             return True
-        if (
-            hasattr(other, "directory")
-            and other.project_directory.resolve() == self.project_directory.resolve()
-            and other.project_directory.lstat() == self.project_directory.lstat()
-            and other.__class__ is self.__class__
-        ):
-            return True
-        return False
+        return (
+            other.__class__ is self.__class__
+            and other._directory_key == self._directory_key
+        )
+
+    def __hash__(self):
+        return hash(self._directory_key)
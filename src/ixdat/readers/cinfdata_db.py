@@ -1,5 +1,7 @@
 """Module defining direct DB reader connection to Surfcat's cinfdata system"""
 import warnings
+from functools import lru_cache
+import numpy as np
 from .. import Measurement
 from ..data_series import DataSeries, ValueSeries, TimeSeries, Field
 from ..techniques.ms import MSSpectrum
@@ -143,23 +145,29 @@ class CinfdataDBReader:
         if self.verbose:
             print("Column names in measurement: ")
 
-        for key in self.group_data.keys():
-            meta = self.group_meta[key]
+        # look these up once, rather than for each of the (often many) columns:
+        group_meta = self.group_meta
+        tstamp = self.tstamp
+        verbose = self.verbose
+        add_series = data_series_list.extend
+
+        for key, data in self.group_data.items():
+            meta = group_meta[key]
             if meta["type"] != 5:  # 5 is specific mass_time measurements
                 continue
 
             column_name = meta["mass_label"]
-            if self.verbose:
+            if verbose:
                 print("Col name: ", column_name)
 
-            tcol = self.group_data[key][:, 0]
-            vcol = self.group_data[key][:, 1]
+            tcol, vcol = split_columns(data)
+            t_name = column_name + "-x"  # cinfdata's name for the column's time
 
             tseries = TimeSeries(
-                name=column_name + "-x",
-                unit_name=get_column_unit(column_name + "-x") or "s",
+                name=t_name,
+                unit_name=get_column_unit(t_name) or "s",
                 data=tcol,
-                tstamp=self.tstamp,
+                tstamp=tstamp,
             )
 
             vseries = ValueSeries(
@@ -168,8 +176,7 @@ class CinfdataDBReader:
                 tseries=tseries,
                 unit_name=get_column_unit(column_name + "-y"),
             )
-            data_series_list.append(tseries)
-            data_series_list.append(vseries)
+            add_series((tseries, vseries))
 
         obj_as_dict = dict(
             name=self.name,
@@ -223,17 +230,19 @@ class CinfdataDBReader:
         # set sample_name, tstamp and measurement name from meta data from cinfdatabase
         self.set_sample_name_tstamp_and_name()
 
-        self.spectrum_list = []
-        for key in self.group_meta:  # key is unique to each measurement
-            group_type = self.group_meta[key]["type"]
-            if group_type == 2:  # type 2 is unique describing XPS data
-                obj_as_dict = self.get_spectrum_as_dict(key, group_type)
-                obj_as_dict["name"] = self.group_meta[key]["name"]
-                self.spectrum_list.append(self.measurement_class.from_dict(obj_as_dict))
-            elif group_type == 4:  # type 4 is unique describing mass scan
-                obj_as_dict = self.get_spectrum_as_dict(key, group_type)
-                obj_as_dict["name"] = self.sample_name
-                self.spectrum_list.append(self.measurement_class.from_dict(obj_as_dict))
+        # All the data is fetched above, so this loop is in memory. It keeps the order
+        # of the spectra, as add_mass_scans relies on them being chronological.
+        from_dict = self.measurement_class.from_dict
+        spectrum_list = []
+        for key, meta in self.group_meta.items():  # key is unique to each measurement
+            group_type = meta["type"]
+            if group_type not in SPECTRUM_METADATA:
+                continue
+            obj_as_dict = self.get_spectrum_as_dict(key, group_type)
+            # type 2 (XPS) spectra have a name. Type 4 (mass scans) use the sample name.
+            obj_as_dict["name"] = meta["name"] if group_type == 2 else self.sample_name
+            spectrum_list.append(from_dict(obj_as_dict))
+        self.spectrum_list = spectrum_list
 
         if not self.spectrum_list:
             warnings.warn(
@@ -265,30 +274,30 @@ class CinfdataDBReader:
         Return spectrum_as_dict (dict of xseries and Fields)
         """
         # Extract x and y data columns and timestamp from group data and metadata
-        x_col = self.group_data[key][:, 0]
-        y_col = self.group_data[key][:, 1]
+        x_col, y_col = split_columns(self.group_data[key])
         metadata = self.group_meta[key]
-        tstamp = self.group_meta[key]["unixtime"]
+        tstamp = metadata["unixtime"]
+        spectrum_metadata = SPECTRUM_METADATA[group_type]
 
         # Create x DataSeries object with appropriate metadata
         x_series = DataSeries(
             data=x_col,
-            name=SPECTRUM_METADATA[group_type]["x_name"],
-            unit_name=SPECTRUM_METADATA[group_type]["x_unit_name"],
+            name=spectrum_metadata["x_name"],
+            unit_name=spectrum_metadata["x_unit_name"],
         )
 
         # Create y Field obj with appropriate metadata and x DataSeries as its only axis
         y_field = Field(
             data=y_col,
-            name=SPECTRUM_METADATA[group_type]["field_name"],
-            unit_name=SPECTRUM_METADATA[group_type]["field_unit"],
+            name=spectrum_metadata["field_name"],
+            unit_name=spectrum_metadata["field_unit"],
             axes_series=[x_series],
         )
 
         # Create dictionary with spectrum object metadata and x-y Field object
         spectrum_as_dict = {
             "sample_name": self.sample_name,
-            "technique": SPECTRUM_METADATA[group_type]["technique"],
+            "technique": spectrum_metadata["technique"],
             "field": y_field,
             "tstamp": tstamp,
             "reader": self,
@@ -304,43 +313,42 @@ class CinfdataDBReader:
         self.grouping_column = "comment"
         self.token = self.sample_name
         self.spectrum_list = self.read_spectrums()
+        # read_spectrums() resets self.tstamp to that of the first spectrum, so:
+        tstamp = self.measurement.tstamp
+        measurement_end_time = self.measurement.time_series[-1].data[-1] + tstamp
 
         if self.verbose:
             print(f"Using {self.measurement.time_series[-1]} to find end of experiment")
-            print(
-                "Unixtime end of exp "
-                f"{self.measurement.time_series[-1].data[-1] + self.tstamp}"
-            )
-
-        # Find index of the first spectrum to include as mass scans of this measurement
-        first_index = 0
-        if self.spectrum_list[0].tstamp < self.tstamp:
-            for i, spectrum in enumerate(self.spectrum_list):
-                if spectrum.tstamp < self.tstamp:
-                    first_index = i
-                else:
-                    break
-        # Find index of the last spectrum to include as mass scans
-        last_index = -1
-        measurement_end_time = self.measurement.time_series[-1].data[-1] + self.tstamp
-
-        if self.spectrum_list[-1].tstamp > measurement_end_time:
-            for i, spectrum in reversed(list(enumerate(self.spectrum_list))):
-                if spectrum.tstamp >= measurement_end_time:
-                    last_index = i
-                else:
-                    break
+            print(f"Unixtime end of exp {measurement_end_time}")
+
+        # The spectra are in chronological order, so we can search their tstamps for
+        # the first spectrum to include, which is the last one started before the
+        # measurement (if any), and for the first to exclude, which is the first one
+        # started at or after the end of the measurement (if any):
+        spectrum_list = self.spectrum_list
+        tstamps = np.fromiter(
+            (spectrum.tstamp for spectrum in spectrum_list),
+            dtype=np.float64,
+            count=len(spectrum_list),
+        )
+        first_index = max(int(np.searchsorted(tstamps, tstamp)) - 1, 0)
+        last_index = int(np.searchsorted(tstamps, measurement_end_time))
 
         if self.verbose:
             print(f"Start and End index of spectrum list: {first_index}, {last_index}\n")
-            print(
-                "Tstamp of first and last spectrum in list: "
-                f"{self.spectrum_list[first_index].tstamp}, "
-                f"{self.spectrum_list[last_index].tstamp}"
-            )
+            if first_index < last_index:
+                print(
+                    "Tstamp of first and last spectrum in list: "
+                    f"{spectrum_list[first_index].tstamp}, "
+                    f"{spectrum_list[last_index - 1].tstamp}"
+                )
+            else:
+                print("No mass scans were started before the end of the measurement")
+        if first_index >= last_index:
+            return
 
         # Create spectrum series and add it to the measurement
-        spectrums_to_add = self.spectrum_list[first_index:last_index]
+        spectrums_to_add = spectrum_list[first_index:last_index]
         ms_spectra = SpectrumSeries.from_spectrum_list(spectrums_to_add)
         self.measurement = self.measurement + ms_spectra
 
@@ -362,28 +370,48 @@ class CinfdataDBReader:
         self.tstamp = float(metadata["unixtime"])
 
 
+def split_columns(data):
+    """Return the two columns of an (N, 2) data array from cinfdata as separate arrays
+
+    The columns of the array are strided views. A single copy of its transpose gives
+    both of them as contiguous arrays, which are faster to work with downstream.
+    """
+    x_col, y_col = np.asarray(data, dtype=np.float64).T.copy()
+    return x_col, y_col
+
+
+# Units of cinfdata columns, looked up by the start and end of the column names:
+COLUMN_NAME_PREFIXES = ("M", "Reactor", "Flow")
+COLUMN_NAME_SUFFIXES = ("pressure-y", "temperature-y", "-x", "-y")  # longest first
+COLUMN_UNITS = {  # {(prefix or None, suffix or None): unit_name}
+    ("M", "pressure-y"): "A",
+    ("M", "temperature-y"): "A",
+    ("M", "-y"): "A",
+    ("M", "-x"): "s",
+    ("Reactor", "pressure-y"): "bar",
+    ("Reactor", "temperature-y"): "celcius",
+    ("Flow", "pressure-y"): "mbar",
+    ("Flow", "temperature-y"): "celcius",
+    ("Flow", "-x"): "ml/min",
+    ("Flow", "-y"): "ml/min",
+    ("Flow", None): "ml/min",
+    (None, "pressure-y"): "mbar",
+    (None, "temperature-y"): "celcius",
+}
+# TODO: Figure out how cinfdata represents units for other stuff.
+#    see https://github.com/ixdat/ixdat/pull/30/files#r811432543, and
+#    https://github.com/CINF/cinfdata/blob/master/sym-files2/export_data.py#L125
+
+
+@lru_cache(maxsize=512)
 def get_column_unit(column_name):
-    """Return the unit name of an ixdat column, i.e the part of the name after the '/'"""
-    if column_name.startswith("M") and column_name.endswith("-y"):
-        unit_name = "A"
-    elif column_name.startswith("M") and column_name.endswith("-x"):
-        unit_name = "s"
-    elif column_name.startswith("Reactor") and column_name.endswith("pressure-y"):
-        unit_name = "bar"
-    elif not column_name.startswith("Reactor") and column_name.endswith("pressure-y"):
-        unit_name = "mbar"
-    elif column_name.endswith("temperature-y"):
-        unit_name = "celcius"
-    elif column_name.startswith("Flow"):
-        unit_name = "ml/min"
-
-    else:
-        # TODO: Figure out how cinfdata represents units for other stuff.
-        #    see https://github.com/ixdat/ixdat/pull/30/files#r811432543, and
-        #    https://github.com/CINF/cinfdata/blob/master/sym-files2/export_data.py#L125
-        unit_name = None
-
-    return unit_name
+    """Return the unit name of a cinfdata column, given its name with -x or -y suffix
+
+    Returns None if the unit of the column is not known (see COLUMN_UNITS)
+    """
+    prefix = next((p for p in COLUMN_NAME_PREFIXES if column_name.startswith(p)), None)
+    suffix = next((s for s in COLUMN_NAME_SUFFIXES if column_name.endswith(s)), None)
+    return COLUMN_UNITS.get((prefix, suffix))
 
 
 SPECTRUM_METADATA = {
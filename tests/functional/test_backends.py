@@ -1,6 +1,17 @@
 """"Tests that an ECMeasurement read from test data behaves as it should"""
 
+from pathlib import Path
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
 from ixdat import Measurement
+from ixdat.backends import DirBackend
+from ixdat.data_series import DataSeries, Field
+from ixdat.db import DB
+from ixdat.exceptions import DataBaseError
 
 
 #  If tox crashes when trying to import matplotlib, see:
@@ -27,3 +38,205 @@ class TestBackends:
         id_ = composed_measurement.save()
         loaded = Measurement.get(id_)
         assert composed_measurement == loaded
+
+    def test_ids_survive_new_backend(self, ec_measurement, fresh_directory_backend):
+        """Test that a new backend on the same directory finds the saved rows"""
+        id_ = ec_measurement.save()
+        new_backend = DirBackend(
+            directory=Path(fresh_directory_backend.name),
+            project_name="test_biologic_ec_measurement",
+        )
+        assert new_backend.contains("measurement", id_)
+        assert new_backend.get_next_available_id("measurement") == id_ + 1
+        assert new_backend.get_row_as_dict("measurement", id_)["name"] == (
+            ec_measurement.name
+        )
+
+    def test_ids_are_unique_across_backends(self, fresh_directory_backend):
+        """Test that two backends on the same directory don't give out the same id"""
+        backends = [
+            DirBackend(
+                directory=Path(fresh_directory_backend.name),
+                project_name="test_biologic_ec_measurement",
+            )
+            for _ in range(2)
+        ]
+        ids = []
+        for n, backend in enumerate(backends + backends):
+            time.sleep(0.02)  # in case folder modification times are coarse
+            ids.append(backend.add_row("data_series", {"name": f"row{n}"}))
+        ids += backends[0].add_rows("data_series", [{"name": "a"}, {"name": "b"}])
+        assert ids == [1, 2, 3, 4, 5, 6]
+        for backend in backends:
+            assert backend.get_row_as_dict("data_series", 6)["name"] == "b"
+
+    @pytest.mark.parametrize("name", ["a", "b"])
+    def test_add_row_does_not_reuse_id(self, fresh_directory_backend, name):
+        """Test that adding a row with the id of a row file already there fails"""
+        backend = DB.backend
+        assert backend.add_row("data_series", {"name": "a", "value": 1}) == 1
+        backend.next_available_ids["data_series"] = 1  # as if the id were stale
+        with pytest.raises(DataBaseError):
+            backend.add_row("data_series", {"name": name, "value": 2})
+        folder = backend.project_directory / "data_series"
+        assert [path.name for path in folder.iterdir()] == ["1_a.ix"]
+        assert backend.get_row_as_dict("data_series", 1)["value"] == 1
+        assert backend.add_row("data_series", {"name": name}) == 2
+
+    def test_rows_added_by_others_while_saving_are_seen(self, fresh_directory_backend):
+        """Test that a row added by another backend during a save isn't missed"""
+        backend = DB.backend
+        other_backend = DirBackend(
+            directory=Path(fresh_directory_backend.name),
+            project_name="test_biologic_ec_measurement",
+        )
+        backend.add_row("data_series", {"name": "a"})
+
+        def find_row_ids_after_other_save(*args):
+            other_backend.update_row("data_series", 10, {"name": "other"})
+            return set()
+
+        with patch.object(
+            backend, "_find_row_ids", side_effect=find_row_ids_after_other_save
+        ):
+            assert backend.add_row("data_series", {"name": "b"}) == 2
+        assert backend.get_next_available_id("data_series") == 11
+        assert backend.get_row_as_dict("data_series", 10)["name"] == "other"
+
+    def test_add_rows(self, fresh_directory_backend):
+        """Test that a batch of rows gets consecutive ids and is fully written"""
+        backend = DB.backend
+        ids = backend.add_rows(
+            "data_series", [{"name": "a"}, {"name": "b/c"}, {"name": "d"}]
+        )
+        assert ids == [1, 2, 3]
+        assert backend.get_row_as_dict("data_series", 2)["name"] == "b/c"
+        folder = backend.project_directory / "data_series"
+        assert not list(folder.glob("*.tmp"))
+
+    def test_failed_add_rows_leaves_no_files(self, fresh_directory_backend):
+        """Test that the files of a batch that fails partway through are removed"""
+        backend = DB.backend
+        rows = [
+            {"name": "a", "data": np.arange(3.0)},
+            {"name": "b"},
+            {"name": "c", "data": np.arange(3.0), "unserializable": object()},
+        ]
+        with pytest.raises(TypeError):
+            backend.add_rows("data_series", rows)
+        assert not list((backend.project_directory / "data_series").iterdir())
+        assert backend.add_rows("data_series", [{"name": "d"}]) == [1]
+
+    def test_rows_are_fresh_and_unshared(self, fresh_directory_backend):
+        """Test that row reads see updates and can't be modified by callers"""
+        backend = DB.backend
+        (i,) = backend.add_rows("data_series", [{"name": "a", "unit_name": "V"}])
+        backend.get_row_as_dict("data_series", i)["unit_name"] = "modified"
+        assert backend.get_row_as_dict("data_series", i)["unit_name"] == "V"
+        backend.update_row("data_series", i, {"name": "a", "unit_name": "mV"})
+        assert backend.get_row_as_dict("data_series", i)["unit_name"] == "mV"
+
+    def test_backend_equality(self, fresh_directory_backend):
+        """Test that DirBackends are equal (and hash equal) if they share a directory"""
+        directory = Path(fresh_directory_backend.name)
+        backend = DirBackend(directory=directory, project_name="one")
+        same_backend = DirBackend(directory=directory, project_name="one")
+        other_backend = DirBackend(directory=directory, project_name="two")
+        assert backend == same_backend
+        assert hash(backend) == hash(same_backend)
+        assert backend != other_backend
+        assert backend != "none"
+        assert len({backend, same_backend, other_backend}) == 2
+
+    def test_save_many_and_get_many(self, ec_measurement, fresh_directory_backend):
+        """Test a save/load round trip of a measurement's series as batches"""
+        backend = DB.backend
+        series_list = ec_measurement.series_list
+        ids = backend.save_many(series_list)
+        assert len(set(ids)) == len(series_list)
+        assert all(s.backend is backend for s in series_list)
+        # saving again changes nothing:
+        assert backend.save_many(series_list) == ids
+        assert backend.get_next_available_id("data_series") == max(ids) + 1
+        loaded = backend.get_many(DataSeries, ids)
+        assert [s.name for s in loaded] == [s.name for s in series_list]
+        assert loaded == series_list
+        # ids and objects can also be given as generators:
+        assert backend.get_many(DataSeries, (i for i in ids)) == loaded
+        assert backend.save_many(s for s in series_list) == ids
+
+    @pytest.mark.parametrize("shape", [(10,), (100_000,), (300, 400)])
+    def test_data_round_trip(self, fresh_directory_backend, shape):
+        """Test that small and large data is saved and loaded"""
+        data = np.arange(np.prod(shape), dtype=float).reshape(shape)
+        field = Field(
+            name="y",
+            unit_name="",
+            data=data,
+            axes_series=[
+                DataSeries(name=f"x{n}", unit_name="", data=np.arange(N))
+                for n, N in enumerate(shape)
+            ],
+        )
+        id_ = field.save()
+        loaded = DataSeries.get(id_)
+        np.testing.assert_array_equal(loaded.data, data)
+
+    def test_get_row_items(self, ec_measurement, fresh_directory_backend):
+        """Test reading only some of the items of a row"""
+        id_ = ec_measurement.save()
+        row = DB.backend.get_row_as_dict("measurement", id_)
+        items = DB.backend.get_row_as_dict(
+            "measurement", id_, keys=["name", "tstamp", "not_a_key"]
+        )
+        assert items == {"name": row["name"], "tstamp": row["tstamp"]}
+
+    def test_next_available_id(self, fresh_directory_backend):
+        """Test that the next available id keeps up with added and updated rows"""
+        backend = DB.backend
+        assert backend.get_next_available_id("data_series") == 1
+        assert backend.add_row("data_series", {"name": "a"}) == 1
+        assert backend.get_next_available_id("data_series") == 2
+        backend.update_row("data_series", 7, {"name": "b"})
+        assert backend.get_next_available_id("data_series") == 8
+        assert backend.add_rows("data_series", [{"name": "c"}, {"name": "d"}]) == [8, 9]
+        assert backend.get_next_available_id("data_series") == 10
+        assert sorted(backend.get_id_list("data_series")) == [1, 7, 8, 9]
+        assert backend.contains("data_series", 7)
+        assert not backend.contains("data_series", 2)
+
+    def test_save_batches_children(self, ec_measurement, fresh_directory_backend):
+        """Test that a measurement's series are saved in batches, not one by one"""
+        backend = DB.backend
+        with patch.object(backend, "add_rows", wraps=backend.add_rows) as add_rows:
+            id_ = ec_measurement.save()
+        assert 0 < add_rows.call_count < len(ec_measurement.series_list)
+        assert Measurement.get(id_) == ec_measurement
+
+    @pytest.mark.parametrize("shape", [(10,), (100_000,)])
+    def test_resave_loaded_data(self, fresh_directory_backend, shape):
+        """Test that re-saving loaded (memory-mapped) data doesn't corrupt it"""
+        data = np.arange(np.prod(shape), dtype=float) + 1
+        id_ = DataSeries(name="x", unit_name="", data=data).save()
+        loaded = DataSeries.get(id_)
+        np.testing.assert_array_equal(loaded.data, data)
+        DB.backend.save(loaded, force=True)
+        np.testing.assert_array_equal(loaded.data, data)
+        np.testing.assert_array_equal(DataSeries.get(id_).data, data)
+
+    def test_object_data_is_saved_but_not_loaded(self, fresh_directory_backend):
+        """Test that object data can be saved, but not loaded, as in earlier versions"""
+        data = np.array([{"a": 1}, None], dtype=object)
+        id_ = DataSeries(name="x", unit_name="", data=data).save()
+        folder = DB.backend.project_directory / "data_series"
+        assert not list(folder.glob("*.tmp"))
+        with pytest.raises(ValueError):
+            DataSeries.get(id_).data
+
+    def test_failed_data_save_leaves_no_tmp_file(self, fresh_directory_backend):
+        """Test that the temporary .npy file of a failed save is removed"""
+        backend = DB.backend
+        with patch("numpy.save", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                DataSeries(name="x", unit_name="", data=np.arange(3.0)).save()
+        assert not list((backend.project_directory / "data_series").glob("*"))
@@ -0,0 +1,179 @@
+"""Tests for readers/cinfdata_db.py"""
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from ixdat.readers.cinfdata_db import CinfdataDBReader, get_column_unit
+from ixdat.spectra import Spectrum
+from ixdat.techniques.ms import MSMeasurement
+
+TSTAMP = 1600000000.0
+
+
+def make_reader(group_data, group_meta):
+    """Return a CinfdataDBReader reading the given data instead of from cinfdata"""
+    mock_plugins = MagicMock()
+    cinf_db = mock_plugins.cinfdata.return_value.__enter__.return_value
+    cinf_db.get_data_group.return_value = group_data
+    cinf_db.get_metadata_group.return_value = group_meta
+    with patch("ixdat.readers.cinfdata_db.plugins", mock_plugins):
+        reader = CinfdataDBReader()
+    reader.token = "my comment"
+    return reader, mock_plugins
+
+
+def mass_time_meta(mass_label):
+    """Return metadata of a mass_time column like that found in cinfdata"""
+    return {
+        "type": 5,
+        "mass_label": mass_label,
+        "comment": "my comment",
+        "time": datetime.fromtimestamp(TSTAMP),
+        "unixtime": TSTAMP,
+    }
+
+
+class TestCinfdataDBReader:
+    """Tests for CinfdataDBReader which don't need a connection to cinfdata"""
+
+    @pytest.fixture
+    def ms_reader(self):
+        group_data = {
+            11: np.array([[0.0, 1e-10], [1.0, 2e-10], [2.0, 3e-10]]),
+            12: np.array([[0.5, 4e-11], [2.0, 5e-11]]),
+            13: np.array([[0.0, 1.0]]),
+        }
+        group_meta = {
+            11: mass_time_meta("M32"),
+            12: mass_time_meta("M44"),
+            13: dict(mass_time_meta("XPS"), type=2),
+        }
+        return make_reader(group_data, group_meta)
+
+    def test_read_ms(self, ms_reader):
+        """Test that mass_time columns become contiguous TimeSeries and ValueSeries"""
+        reader, mock_plugins = ms_reader
+        with patch("ixdat.readers.cinfdata_db.plugins", mock_plugins):
+            obj_as_dict = reader.read_ms()
+
+        series_list = obj_as_dict["series_list"]
+        assert [s.name for s in series_list] == ["M32-x", "M32", "M44-x", "M44"]
+        tseries, vseries = series_list[:2]
+        assert tseries.unit_name == "s"
+        assert tseries.tstamp == TSTAMP
+        assert vseries.unit_name == "A"
+        assert vseries.tseries is tseries
+        np.testing.assert_array_equal(tseries.data, [0.0, 1.0, 2.0])
+        np.testing.assert_array_equal(vseries.data, [1e-10, 2e-10, 3e-10])
+        assert tseries.data.flags["C_CONTIGUOUS"]
+        assert vseries.data.flags["C_CONTIGUOUS"]
+        assert obj_as_dict["sample_name"] == "my comment"
+
+    def test_read_spectrums(self):
+        """Test that XPS spectra and mass scans are read in order, skipping the rest"""
+        x = np.array([[1.0, 10.0], [2.0, 20.0]])
+        group_data = {21: x, 22: x * 2, 23: x * 3, 24: x * 4}
+        group_meta = {
+            21: dict(mass_time_meta(None), type=4, unixtime=TSTAMP + 10),
+            22: dict(mass_time_meta(None), type=2, name="Survey"),
+            23: mass_time_meta("M32"),
+            24: dict(mass_time_meta(None), type=4, unixtime=TSTAMP + 20),
+        }
+        reader, mock_plugins = make_reader(group_data, group_meta)
+        reader.measurement_class = Spectrum
+        reader.include_mass_scans = True
+        with patch("ixdat.readers.cinfdata_db.plugins", mock_plugins):
+            spectrum_list = reader.read_spectrums()
+
+        assert [s.name for s in spectrum_list] == ["my comment", "Survey", "my comment"]
+        assert [s.technique for s in spectrum_list] == [
+            "MS_spectrum",
+            "XPS",
+            "MS_spectrum",
+        ]
+        assert spectrum_list[2].tstamp == TSTAMP + 20
+        np.testing.assert_array_equal(spectrum_list[1].y, [20.0, 40.0])
+        assert spectrum_list[1].x.flags["C_CONTIGUOUS"]
+        assert spectrum_list[1].y.flags["C_CONTIGUOUS"]
+
+    @pytest.mark.parametrize(
+        "spectrum_times, expected_times",
+        [
+            ([-5, 0.5, 1.5, 2.5], [-5, 0.5, 1.5]),
+            ([-10, -5, 0.5, 1.5], [-5, 0.5, 1.5]),
+            ([0, 1, 2, 3], [0, 1]),
+            ([0.5, 1.0], [0.5, 1.0]),
+        ],
+    )
+    def test_add_mass_scans(self, ms_reader, spectrum_times, expected_times, capsys):
+        """Test that mass scans from the last one before the measurement until its
+        end (here t=2, relative to its tstamp) are added to the measurement"""
+        reader, mock_plugins = ms_reader
+        reader.verbose = True
+        with patch("ixdat.readers.cinfdata_db.plugins", mock_plugins):
+            reader.measurement = MSMeasurement.from_dict(reader.read_ms())
+            cinf_db = mock_plugins.cinfdata.return_value.__enter__.return_value
+            cinf_db.get_data_group.return_value = {
+                30 + n: np.array([[1.0, 1e-10], [2.0, 2e-10]])
+                for n in range(len(spectrum_times))
+            }
+            cinf_db.get_metadata_group.return_value = {
+                30 + n: dict(mass_time_meta(None), type=4, unixtime=TSTAMP + t)
+                for n, t in enumerate(spectrum_times)
+            }
+            reader.add_mass_scans()
+
+        spectrum_series = reader.measurement.spectrum_series
+        np.testing.assert_allclose(
+            spectrum_series.t + spectrum_series.tstamp - TSTAMP, expected_times
+        )
+        assert (
+            "Tstamp of first and last spectrum in list: "
+            f"{TSTAMP + expected_times[0]}, {TSTAMP + expected_times[-1]}"
+        ) in capsys.readouterr().out
+
+    def test_add_mass_scans_without_any_in_range(self, ms_reader, capsys):
+        """Test that there's nothing to add if all mass scans start after the end"""
+        reader, mock_plugins = ms_reader
+        reader.verbose = True
+        with patch("ixdat.readers.cinfdata_db.plugins", mock_plugins):
+            reader.measurement = MSMeasurement.from_dict(reader.read_ms())
+            cinf_db = mock_plugins.cinfdata.return_value.__enter__.return_value
+            cinf_db.get_data_group.return_value = {
+                30: np.array([[1.0, 1e-10], [2.0, 2e-10]])
+            }
+            cinf_db.get_metadata_group.return_value = {
+                30: dict(mass_time_meta(None), type=4, unixtime=TSTAMP + 5)
+            }
+            measurement = reader.measurement
+            reader.add_mass_scans()
+
+        assert reader.measurement is measurement
+        assert "No mass scans were started" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "column_name, unit_name",
+    [
+        ("M32-y", "A"),
+        ("M32-x", "s"),
+        ("Mpressure-y", "A"),
+        ("Reactor pressure-y", "bar"),
+        ("Reactor temperature-y", "celcius"),
+        ("Reactor flow-y", None),
+        ("Reactor-x", None),
+        ("Flow1-y", "ml/min"),
+        ("Flow1-x", "ml/min"),
+        ("Flow pressure-y", "mbar"),
+        ("Flow temperature-y", "celcius"),
+        ("Chamber pressure-y", "mbar"),
+        ("Sample temperature-y", "celcius"),
+        ("Sample current-y", None),
+        ("pressure", None),
+    ],
+)
+def test_get_column_unit(column_name, unit_name):
+    """Test that cinfdata column names give the right units"""
+    assert get_column_unit(column_name) == unit_name
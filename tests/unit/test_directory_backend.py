@@ -0,0 +1,92 @@
+"""Tests for backends/directory_backend.py"""
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from ixdat.backends.directory_backend import (
+    id_from_name,
+    id_from_path,
+    read_json_file,
+    read_json_file_items,
+    write_json_file,
+)
+
+
+@pytest.mark.parametrize(
+    "file_name, expected_id",
+    [
+        ("1_potential.ix", 1),
+        ("42_Ewe_DIV_V.ix.npy", 42),
+        ("107_with_many_underscores.ix", 107),
+        ("not_a_row.ix", None),
+        ("12.ix", None),
+    ],
+)
+def test_id_from_name(file_name, expected_id):
+    """Test that the id is parsed from the start of a row's file name"""
+    assert id_from_name(file_name) == expected_id
+    assert id_from_path(Path("some_table") / file_name) == expected_id
+
+
+@pytest.mark.parametrize(
+    "metadata",
+    [
+        {"pressure": float("nan"), "temperature": 300.0},
+        {"limits": [0, float("inf"), -float("inf")]},
+        {"values": np.array([1.0, np.nan])},
+    ],
+)
+def test_non_finite_floats_round_trip(tmp_path, metadata):
+    """Test that NaN and infinity survive writing and reading a row"""
+    path = tmp_path / "1_row.ix"
+    obj_as_dict = {"name": "row", "metadata": metadata}
+    write_json_file(path, obj_as_dict)
+    metadata_read = read_json_file(path)["metadata"]
+    for key, value in metadata.items():
+        np.testing.assert_array_equal(metadata_read[key], value)
+
+
+def test_read_json_file_written_by_json(tmp_path):
+    """Test that rows written with NaN by the standard library's json can be read"""
+    path = tmp_path / "1_row.ix"
+    with open(path, "w") as f:
+        json.dump({"name": "row", "value": float("nan")}, f, indent=4)
+    obj_as_dict = read_json_file(path)
+    assert obj_as_dict["name"] == "row"
+    assert math.isnan(obj_as_dict["value"])
+
+
+@pytest.mark.parametrize(
+    "metadata",
+    [
+        {"every_other": np.arange(10.0)[::2]},
+        {"half_precision": np.arange(3, dtype=np.float16)},
+        {"strings": np.array(["a", "b"])},
+        {"big_int": 2**70},
+    ],
+)
+def test_write_json_file_of_what_orjson_cant_write(tmp_path, metadata):
+    """Test that rows which orjson can't serialize are written all the same"""
+    path = tmp_path / "1_row.ix"
+    write_json_file(path, {"name": "row", "metadata": metadata})
+    metadata_read = read_json_file(path)["metadata"]
+    for key, value in metadata.items():
+        np.testing.assert_array_equal(metadata_read[key], value)
+
+
+def test_read_json_file_as_utf8(tmp_path):
+    """Test that non-ASCII characters are read as UTF-8, whatever the locale"""
+    path = tmp_path / "1_row.ix"
+    path.write_bytes('{"name": "Århus μA"}'.encode("utf-8"))
+    assert read_json_file(path)["name"] == "Århus μA"
+
+
+def test_read_json_file_items_with_nan(tmp_path):
+    """Test that some items of a row with NaN can be read, even with ijson"""
+    pytest.importorskip("ijson")
+    path = tmp_path / "1_row.ix"
+    write_json_file(path, {"metadata": {"p": float("nan")}, "name": "row", "tstamp": 1})
+    assert read_json_file_items(path, ["name", "tstamp"]) == {"name": "row", "tstamp": 1}